@@ -13,12 +13,27 @@ Uses Claude to:
 Requires: ANTHROPIC_API_KEY secret in GitHub repo settings
 """
 
+import io
 import os
 import json
-import glob
+import time
+import hashlib
+import sqlite3
+import functools
 import anthropic
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    import orjson                      # optional — much faster on large reports
+    json_loads = orjson.loads
+    def json_dumps_bytes(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    json_loads = json.loads
+    def json_dumps_bytes(obj):
+        return json.dumps(obj).encode()
+
 # ─────────────────────────────────────────────────────────
 # CONFIG
 # ─────────────────────────────────────────────────────────
@@ -28,53 +43,70 @@ REPO              = os.environ.get("REPO", "")
 SHA               = os.environ.get("SHA", "")
 ACTOR             = os.environ.get("ACTOR", "unknown")
 MAX_FIXES_PER_RUN = 10   # Limit to avoid long runs
+MAX_PARALLEL      = 8    # Concurrent Claude requests
+CLAUDE_RETRIES    = 3    # Retries on rate limits / transient API errors
+CLAUDE_TIMEOUT    = 60   # Seconds per finding in a Claude request
+CLAUDE_MODEL      = "claude-opus-4-5-20251101"
+FIX_CACHE_FILE    = ".securops-cache.db"   # Persisted between runs by actions/cache
+FIX_CACHE_TTL     = 7 * 24 * 3600          # Seconds before a cached fix is re-asked
+SEVERITY_EMOJI    = {"CRITICAL": "🔴", "HIGH": "🟠", "MEDIUM": "🟡"}
 
 # ─────────────────────────────────────────────────────────
 # HELPERS
 # ─────────────────────────────────────────────────────────
 
-def load_report(path_pattern):
+def load_report(path):
     """Load a JSON report file, return empty dict if not found."""
-    files = glob.glob(path_pattern, recursive=True)
-    if not files:
+    if not os.path.exists(path):
         return {}
     try:
-        with open(files[0]) as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            return json_loads(f.read())
     except Exception:
         return {}
 
-def load_jsonl(path_pattern):
-    """Load a JSONL (newline-delimited JSON) report file."""
-    files = glob.glob(path_pattern, recursive=True)
+def load_jsonl(path, limit=None):
+    """Load a JSONL (newline-delimited JSON) report file.
+
+    Stops after `limit` records so large reports are never read in full.
+    """
     results = []
-    if not files:
+    if not os.path.exists(path):
         return results
     try:
-        with open(files[0]) as f:
+        with open(path) as f:
             for line in f:
+                if limit is not None and len(results) >= limit:
+                    break
                 line = line.strip()
                 if line:
                     try:
-                        results.append(json.loads(line))
+                        results.append(json_loads(line))
                     except Exception:
                         pass
     except Exception:
         pass
     return results
 
+@functools.lru_cache(maxsize=128)
+def load_lines(filepath):
+    """Read a source file once; findings often point at the same file."""
+    with open(filepath) as f:
+        return f.readlines()  # not splitlines(): \f, \v etc. are not line breaks
+
+SNIPPET_MARK = ">>>"
+SNIPPET_PAD  = "   "
+
 def read_file_snippet(filepath, line_num, context=5):
     """Read code around a specific line for context."""
     try:
-        with open(filepath) as f:
-            lines = f.readlines()
+        lines = load_lines(filepath)
         start = max(0, line_num - context - 1)
         end   = min(len(lines), line_num + context)
-        snippet = []
-        for i, line in enumerate(lines[start:end], start=start+1):
-            marker = ">>>" if i == line_num else "   "
-            snippet.append(f"{marker} {i:4d} | {line.rstrip()}")
-        return "\n".join(snippet)
+        return "\n".join(
+            f"{SNIPPET_MARK if i == line_num else SNIPPET_PAD} {i:4d} | {line.rstrip()}"
+            for i, line in enumerate(lines[start:end], start=start+1)
+        )
     except Exception:
         return "(could not read file)"
 
@@ -86,8 +118,15 @@ def collect_findings():
     """Collect all findings from all scan reports."""
     findings = []
 
+    # Reports are independent files — read them concurrently
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        sast_job   = pool.submit(load_report, "reports/report-sast/semgrep.json")
+        sca_job    = pool.submit(load_report, "reports/report-sca/trivy.json")
+        iac_job    = pool.submit(load_report, "reports/report-iac/checkov.json")
+        nuclei_job = pool.submit(load_jsonl, "reports/report-dast/nuclei.json", limit=3)
+    sast, sca, iac, nuclei = sast_job.result(), sca_job.result(), iac_job.result(), nuclei_job.result()
+
     # ── Semgrep (SAST) ───────────────────────────────────
-    sast = load_report("reports/report-sast/semgrep.json")
     for r in sast.get("results", [])[:5]:
         if r.get("extra", {}).get("severity") == "ERROR":
             findings.append({
@@ -102,7 +141,6 @@ def collect_findings():
             })
 
     # ── Trivy (SCA) ──────────────────────────────────────
-    sca = load_report("reports/report-sca/trivy.json")
     for result in sca.get("Results", [])[:3]:
         for v in result.get("Vulnerabilities", [])[:3]:
             if v.get("Severity") in ["CRITICAL", "HIGH"]:
@@ -118,7 +156,6 @@ def collect_findings():
                 })
 
     # ── Checkov (IaC) ────────────────────────────────────
-    iac = load_report("reports/report-iac/checkov.json")
     for check in iac.get("results", {}).get("failed_checks", [])[:3]:
         if check.get("severity") == "CRITICAL":
             findings.append({
@@ -133,8 +170,7 @@ def collect_findings():
             })
 
     # ── Nuclei (DAST) ────────────────────────────────────
-    nuclei = load_jsonl("reports/report-dast/nuclei.json")
-    for r in nuclei[:3]:
+    for r in nuclei:
         if r.get("info", {}).get("severity") in ["critical", "high"]:
             findings.append({
                 "tool"     : "Nuclei DAST",
@@ -153,11 +189,44 @@ def collect_findings():
 # AI FIX GENERATION
 # ─────────────────────────────────────────────────────────
 
-def generate_fix(client, finding):
-    """Ask Claude to generate a specific fix for a finding."""
-    prompt = f"""You are a security engineer. Analyze this security finding and provide a concrete fix.
+def finding_key(finding):
+    """Identity of a finding — same tool, rule, location and message."""
+    return (finding["tool"], finding["type"], finding["file"], finding["line"], finding["message"])
+
+def dedupe_findings(findings):
+    """Return (unique findings, position of each finding's fix in unique)."""
+    seen, unique, index = {}, [], []
+    for finding in findings:
+        key = finding_key(finding)
+        if key not in seen:
+            seen[key] = len(unique)
+            unique.append(finding)
+        index.append(seen[key])
+    return unique, index
+
+# Static instructions — identical for every finding, so they are sent as a
+# cached system block. Keep anything run-specific (SHA, timestamps) out of it.
+FIX_INSTRUCTIONS = """You are a security engineer. Analyze the security findings you are given and provide a concrete fix for each.
+
+Provide:
+1. **Root Cause** (1 sentence)
+2. **Exact Fix** (show the corrected code or command)
+3. **Why This Fix Works** (1-2 sentences)
+4. **Prevention** (1 sentence for future)
 
-TOOL: {finding['tool']}
+Be specific. Show actual code changes, not generic advice.
+Write each fix in markdown. When asked for JSON, reply with the JSON alone and put each markdown fix inside its string."""
+
+BATCH_PROMPT = (
+    "Analyze the following {count} findings.\n"
+    "Return ONLY valid JSON, no prose: a JSON array of {count} strings, "
+    "each the markdown fix for the finding with the same number, in the same order.\n\n"
+    "{findings}"
+)
+
+def format_finding(finding):
+    """Render one finding as the plain-text block Claude is asked to analyze."""
+    return f"""TOOL: {finding['tool']}
 SEVERITY: {finding['severity']}
 TYPE: {finding['type']}
 FILE: {finding['file']}
@@ -167,26 +236,141 @@ ISSUE: {finding['message']}
 CODE CONTEXT:
 {finding['snippet']}
 
-FIX HINT FROM TOOL: {finding['fix_hint']}
+FIX HINT FROM TOOL: {finding['fix_hint']}"""
+
+def ask_claude(client, prompt, max_tokens):
+    """Send one prompt with the cached instructions, return the response text."""
+    response = client.messages.create(
+        model=CLAUDE_MODEL,
+        max_tokens=max_tokens,
+        system=[{
+            "type"          : "text",
+            "text"          : FIX_INSTRUCTIONS,
+            "cache_control" : {"type": "ephemeral"},
+        }],
+        messages=[{"role": "user", "content": prompt}]
+    )
+    # The instructions are shorter than the model's minimum cacheable prompt,
+    # so hits only appear once they grow; log them then, not a 0 every call.
+    cached = getattr(response.usage, "cache_read_input_tokens", 0) or 0
+    if cached:
+        print(f"   ↳ {cached} cached input tokens")
+    return response.content[0].text
+
+FIX_FAILED = "AI fix generation failed"
+
+def strip_code_fence(text):
+    """Drop a surrounding ``` / ```json fence that Claude sometimes adds around JSON."""
+    text = text.strip()
+    if text.startswith("```") and text.endswith("```"):
+        body = text.partition("\n")[2]
+        text = body.rsplit("```", 1)[0] if body else text[3:-3]
+    return text.strip()
 
-Provide:
-1. **Root Cause** (1 sentence)
-2. **Exact Fix** (show the corrected code or command)
-3. **Why This Fix Works** (1-2 sentences)
-4. **Prevention** (1 sentence for future)
+def generate_fix(client, finding):
+    """Ask Claude to generate a specific fix for a finding."""
+    try:
+        return ask_claude(client, format_finding(finding), max_tokens=800)
+    except Exception as e:
+        return f"{FIX_FAILED}: {e}"
+
+def generate_all_fixes(client, findings):
+    """Ask Claude for all fixes in one request, one markdown fix per finding.
+
+    Falls back to one request per finding (run concurrently) if the batched
+    call fails or the reply is not a JSON array of the expected length.
+    """
+    numbered = "\n\n".join(
+        f"### FINDING {i}\n{format_finding(finding)}"
+        for i, finding in enumerate(findings, 1)
+    )
+    prompt = BATCH_PROMPT.format(count=len(findings), findings=numbered)
+    try:
+        # The batched reply grows with the findings, so its timeout does too
+        batch_client = client.with_options(timeout=CLAUDE_TIMEOUT * len(findings))
+        fixes = json_loads(strip_code_fence(ask_claude(batch_client, prompt, max_tokens=800 * len(findings))))
+        if isinstance(fixes, list) and len(fixes) == len(findings) and all(isinstance(x, str) for x in fixes):
+            return fixes
+        print("⚠️  Batched reply did not match the findings — retrying per finding")
+    except Exception as e:
+        print(f"⚠️  Batched fix generation failed ({e}) — retrying per finding")
 
-Be specific. Show actual code changes, not generic advice.
-Format as markdown."""
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL, len(findings))) as pool:
+        return list(pool.map(lambda f: generate_fix(client, f), findings))
 
+# ─────────────────────────────────────────────────────────
+# FIX CACHE (persists across CI runs)
+# ─────────────────────────────────────────────────────────
+
+# Everything besides the finding that shapes a fix — changing the model or
+# either prompt invalidates fixes cached under the old ones
+FIX_CACHE_SALT = hashlib.sha256(
+    "\0".join((CLAUDE_MODEL, FIX_INSTRUCTIONS, BATCH_PROMPT)).encode()
+).hexdigest()
+
+def fix_cache_key(finding):
+    """Fingerprint a finding; includes the snippet, so changed code is re-analyzed."""
+    # stdlib json (not orjson) so the key is identical in every environment
+    return hashlib.sha256((FIX_CACHE_SALT + json.dumps(finding, sort_keys=True)).encode()).hexdigest()
+
+def open_fix_cache():
+    """Open the fix cache, or return None if it cannot be used."""
+    db = None
     try:
-        response = client.messages.create(
-            model="claude-opus-4-5-20251101",
-            max_tokens=800,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.content[0].text
-    except Exception as e:
-        return f"AI fix generation failed: {e}"
+        db = sqlite3.connect(FIX_CACHE_FILE)
+        db.execute("CREATE TABLE IF NOT EXISTS fixes (k TEXT PRIMARY KEY, fix TEXT, ts INTEGER)")
+        return db
+    except sqlite3.Error as e:
+        print(f"⚠️  Fix cache unavailable: {e}")
+        if db:
+            db.close()
+        return None
+
+def lookup_fixes(db, keys):
+    """Return {key: fix} for keys cached within the TTL."""
+    cutoff = int(time.time()) - FIX_CACHE_TTL
+    found  = {}
+    try:
+        for key in keys:
+            row = db.execute("SELECT fix FROM fixes WHERE k = ? AND ts >= ?", (key, cutoff)).fetchone()
+            if row:
+                found[key] = row[0]
+    except sqlite3.Error as e:
+        print(f"⚠️  Fix cache lookup failed: {e}")
+    return found
+
+def store_fixes(db, fixes_by_key):
+    """Cache successful fixes and drop expired ones; failures are retried on the next run."""
+    now = int(time.time())
+    try:
+        with db:
+            db.execute("DELETE FROM fixes WHERE ts < ?", (now - FIX_CACHE_TTL,))
+            db.executemany(
+                "INSERT OR REPLACE INTO fixes (k, fix, ts) VALUES (?, ?, ?)",
+                [(k, fix, now) for k, fix in fixes_by_key.items() if not fix.startswith(FIX_FAILED)],
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️  Fix cache update failed: {e}")
+
+def generate_fixes_cached(client, findings):
+    """generate_all_fixes(), reusing fixes cached by earlier runs."""
+    keys  = [fix_cache_key(f) for f in findings]
+    db    = open_fix_cache()
+    fixes = lookup_fixes(db, keys) if db else {}
+    if fixes:
+        print(f"   ♻️  {len(fixes)} fix(es) reused from cache")
+
+    misses = [(f, k) for f, k in zip(findings, keys) if k not in fixes]
+    if misses:
+        new = generate_all_fixes(client, [f for f, _ in misses])
+        fresh = {k: fix for (_, k), fix in zip(misses, new)}
+        if db:
+            store_fixes(db, fresh)
+        fixes.update(fresh)
+
+    if db:
+        db.close()
+    return [fixes[k] for k in keys]
 
 # ─────────────────────────────────────────────────────────
 # GITHUB ISSUE CREATION
@@ -200,57 +384,53 @@ def create_github_issue(findings_with_fixes):
 
     try:
         import urllib.request
-        import urllib.parse
 
         timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
         sha_short = SHA[:7] if SHA else "unknown"
 
-        # Build issue body
-        body_lines = [
-            f"## 🤖 SecurOps AI Auto-Fix Report",
-            f"",
-            f"**Commit:** `{sha_short}` | **By:** @{ACTOR} | **Time:** {timestamp}",
-            f"",
-            f"Found **{len(findings_with_fixes)}** issue(s) requiring attention.",
-            f"Claude has analyzed each finding and provided specific fixes below.",
-            f"",
-            f"---",
-        ]
+        # Build issue body — one write per section, joined once at the end
+        buf = io.StringIO()
+        buf.write(
+            f"## 🤖 SecurOps AI Auto-Fix Report\n"
+            f"\n"
+            f"**Commit:** `{sha_short}` | **By:** @{ACTOR} | **Time:** {timestamp}\n"
+            f"\n"
+            f"Found **{len(findings_with_fixes)}** issue(s) requiring attention.\n"
+            f"Claude has analyzed each finding and provided specific fixes below.\n"
+            f"\n"
+            f"---"
+        )
 
         for i, (finding, fix) in enumerate(findings_with_fixes, 1):
-            severity_emoji = {"CRITICAL": "🔴", "HIGH": "🟠", "MEDIUM": "🟡"}.get(finding["severity"], "⚪")
+            severity_emoji = SEVERITY_EMOJI.get(finding["severity"], "⚪")
             line_info = f' line {finding["line"]}' if finding['line'] else ''
-            body_lines += [
-                f"",
-                f"## {severity_emoji} Issue {i}: {finding['type']}",
-                f"**Tool:** {finding['tool']} | **Severity:** {finding['severity']}",
-                f"**Location:** `{finding['file']}`{line_info}",
-                f"",
-                f"**Finding:** {finding['message']}",
-                f"",
-                f"### 🤖 Claude's Fix:",
-                f"",
-                fix,
-                f"",
-                f"---",
-            ]
-
-        body_lines += [
-            f"",
-            f"*Generated by SecurOps AI Auto-Fix using Claude | [View pipeline run](https://github.com/{REPO}/actions)*",
-        ]
-
-        body = "\n".join(body_lines)
-
-        # Count by severity
-        critical = sum(1 for f, _ in findings_with_fixes if f["severity"] == "CRITICAL")
-        high     = sum(1 for f, _ in findings_with_fixes if f["severity"] == "HIGH")
-
-        issue_data = json.dumps({
+            buf.write(
+                f"\n"
+                f"\n## {severity_emoji} Issue {i}: {finding['type']}"
+                f"\n**Tool:** {finding['tool']} | **Severity:** {finding['severity']}"
+                f"\n**Location:** `{finding['file']}`{line_info}"
+                f"\n"
+                f"\n**Finding:** {finding['message']}"
+                f"\n"
+                f"\n### 🤖 Claude's Fix:"
+                f"\n"
+                f"\n{fix}"
+                f"\n"
+                f"\n---"
+            )
+
+        buf.write(
+            f"\n"
+            f"\n*Generated by SecurOps AI Auto-Fix using Claude | [View pipeline run](https://github.com/{REPO}/actions)*"
+        )
+
+        body = buf.getvalue()
+
+        issue_data = json_dumps_bytes({
             "title"  : f"🤖 SecurOps AI Fix: {len(findings_with_fixes)} issues found (commit {sha_short})",
             "body"   : body,
             "labels" : ["security", "ai-auto-fix", "automated"],
-        }).encode()
+        })
 
         req = urllib.request.Request(
             f"https://api.github.com/repos/{REPO}/issues",
@@ -262,8 +442,8 @@ def create_github_issue(findings_with_fixes):
             },
             method="POST"
         )
-        with urllib.request.urlopen(req) as resp:
-            result = json.loads(resp.read())
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            result = json_loads(resp.read())
             print(f"✅ GitHub Issue created: {result.get('html_url')}")
 
     except Exception as e:
@@ -277,28 +457,34 @@ def create_github_issue(findings_with_fixes):
 # SAVE FIX REPORT
 # ─────────────────────────────────────────────────────────
 
+def _write_finding(f, i, finding, fix):
+    """Write one finding + its AI fix as a report section."""
+    f.write(
+        f"\n## Issue {i}: [{finding['severity']}] {finding['type']} — {finding['tool']}"
+        f"\n**File:** `{finding['file']}` | **Line:** {finding['line']}"
+        f"\n**Issue:** {finding['message']}"
+        f"\n"
+        f"\n### AI Fix:"
+        f"\n{fix}"
+        f"\n"
+        f"\n---"
+        f"\n"
+    )
+
 def save_fix_report(findings_with_fixes):
-    """Save the AI fix report as a markdown file (always)."""
+    """Save the AI fix report as a markdown file (always).
+
+    Sections are streamed to disk as they are formatted, so the full report
+    is never held in memory and a crash mid-run leaves a partial report.
+    """
     timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-    lines = [
-        f"# 🤖 SecurOps AI Auto-Fix Report",
-        f"Generated: {timestamp} | Commit: {SHA[:7] if SHA else 'local'}",
-        f"",
-    ]
-    for i, (finding, fix) in enumerate(findings_with_fixes, 1):
-        lines += [
-            f"## Issue {i}: [{finding['severity']}] {finding['type']} — {finding['tool']}",
-            f"**File:** `{finding['file']}` | **Line:** {finding['line']}",
-            f"**Issue:** {finding['message']}",
-            f"",
-            f"### AI Fix:",
-            fix,
-            f"",
-            f"---",
-            f"",
-        ]
     with open("ai-fix-report.md", "w") as f:
-        f.write("\n".join(lines))
+        f.write(
+            f"# 🤖 SecurOps AI Auto-Fix Report\n"
+            f"Generated: {timestamp} | Commit: {SHA[:7] if SHA else 'local'}\n"
+        )
+        for i, (finding, fix) in enumerate(findings_with_fixes, 1):
+            _write_finding(f, i, finding, fix)
     print(f"✅ Fix report saved: ai-fix-report.md")
 
 # ─────────────────────────────────────────────────────────
@@ -315,8 +501,13 @@ def main():
         print("   Add ANTHROPIC_API_KEY to GitHub repo secrets to enable AI fixes")
         return
 
-    # Initialize Claude client
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    # Initialize Claude client — the SDK retries 429/5xx/529 with
+    # exponential backoff + jitter before generate_fix sees an error
+    client = anthropic.Anthropic(
+        api_key=ANTHROPIC_API_KEY,
+        max_retries=CLAUDE_RETRIES,
+        timeout=CLAUDE_TIMEOUT,
+    )
 
     # Collect all findings
     print("📊 Collecting findings from all scan reports...")
@@ -329,13 +520,16 @@ def main():
     print(f"   Found {len(findings)} issue(s) to analyze")
     print()
 
-    # Generate AI fixes
-    findings_with_fixes = []
-    for i, finding in enumerate(findings, 1):
-        print(f"🔍 Analyzing issue {i}/{len(findings)}: [{finding['severity']}] {finding['type']} ({finding['tool']})")
-        fix = generate_fix(client, finding)
-        findings_with_fixes.append((finding, fix))
-        print(f"   ✅ Fix generated")
+    # Generate AI fixes (one batched request, per-finding fallback),
+    # asking only once per distinct finding
+    unique, index = dedupe_findings(findings)
+    if len(unique) < len(findings):
+        print(f"   {len(findings) - len(unique)} duplicate finding(s) will reuse a fix")
+    for i, finding in enumerate(unique, 1):
+        print(f"🔍 Analyzing issue {i}/{len(unique)}: [{finding['severity']}] {finding['type']} ({finding['tool']})")
+    fixes = generate_fixes_cached(client, unique)
+    findings_with_fixes = [(finding, fixes[pos]) for finding, pos in zip(findings, index)]
+    print(f"   ✅ {len(fixes)} fix(es) generated")
 
     print()
 
@@ -11,10 +11,28 @@ Generates:
 
 import os
 import json
-import glob
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from itertools import islice
 from pathlib import Path
-from jinja2 import Template
+from jinja2 import DictLoader, Environment, FileSystemBytecodeCache
+
+try:
+    import orjson                      # optional — much faster parse/dump
+    json_loads = orjson.loads
+    def json_dumps_pretty(obj):
+        return orjson.dumps(obj, default=list, option=orjson.OPT_INDENT_2)
+except ImportError:
+    try:
+        import ujson                   # fallback where orjson wheels are missing (e.g. musl)
+        json_loads = ujson.loads
+        def json_dumps_pretty(obj):
+            return ujson.dumps(obj, default=list, indent=2, escape_forward_slashes=False).encode()
+    except ImportError:
+        json_loads = json.loads
+        def json_dumps_pretty(obj):
+            return json.dumps(obj, default=list, indent=2).encode()
 
 # ─────────────────────────────────────────────────────────
 # READ ENV FROM GITHUB ACTIONS
@@ -25,124 +43,177 @@ RUN_ID         = os.environ.get("RUN_ID", "0")
 RUN_URL        = os.environ.get("RUN_URL", "#")
 EVENT          = os.environ.get("EVENT", "push")
 REF            = os.environ.get("REF", "main")
-TIMESTAMP      = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+NOW            = datetime.now(timezone.utc)   # one instant for the whole run
+TIMESTAMP      = NOW.strftime("%Y-%m-%d %H:%M UTC")
+SEV_ORDER      = ("CRITICAL", "HIGH", "MEDIUM", "LOW")
+HIGH_CRIT      = frozenset({"CRITICAL", "HIGH"})
+DAST_SEVERITIES = frozenset({"CRITICAL", "HIGH", "MEDIUM"})
+
+# (key, env var prefix, tool, icon, label) — one row per scanner
+SCANS = (
+    ("secrets", "SECRET", "Gitleaks", "🔐", "Secrets"),
+    ("sast",    "SAST",   "Semgrep",  "🔍", "SAST"),
+    ("sca",     "SCA",    "Trivy",    "🛡️", "SCA"),
+    ("dast",    "DAST",   "Nuclei",   "🌐", "DAST"),
+    ("iac",     "IAC",    "Checkov",  "🏗️", "IaC"),
+)
 
 RESULTS = {
-    "secrets" : {"result": os.environ.get("SECRET_RESULT", "unknown"), "count": int(os.environ.get("SECRET_COUNT", 0) or 0), "tool": "Gitleaks",  "icon": "🔐", "label": "Secrets"},
-    "sast"    : {"result": os.environ.get("SAST_RESULT",   "unknown"), "count": int(os.environ.get("SAST_COUNT",   0) or 0), "tool": "Semgrep",   "icon": "🔍", "label": "SAST"},
-    "sca"     : {"result": os.environ.get("SCA_RESULT",    "unknown"), "count": int(os.environ.get("SCA_COUNT",    0) or 0), "tool": "Trivy",     "icon": "🛡️", "label": "SCA"},
-    "dast"    : {"result": os.environ.get("DAST_RESULT",   "unknown"), "count": int(os.environ.get("DAST_COUNT",   0) or 0), "tool": "Nuclei",    "icon": "🌐", "label": "DAST"},
-    "iac"     : {"result": os.environ.get("IAC_RESULT",    "unknown"), "count": int(os.environ.get("IAC_COUNT",    0) or 0), "tool": "Checkov",   "icon": "🏗️", "label": "IaC"},
+    key: {
+        "result": os.environ.get(f"{env}_RESULT", "unknown"),
+        "count" : int(os.environ.get(f"{env}_COUNT") or 0),
+        "tool"  : tool,
+        "icon"  : icon,
+        "label" : label,
+    }
+    for key, env, tool, icon, label in SCANS
 }
 
+outcomes      = Counter(r["result"] for r in RESULTS.values())
 total_issues  = sum(r["count"] for r in RESULTS.values())
-all_passed    = all(r["result"] == "success" for r in RESULTS.values())
-any_failed    = any(r["result"] == "failure"  for r in RESULTS.values())
+all_passed    = outcomes["success"] == len(RESULTS)
+any_failed    = outcomes["failure"] > 0
 gate_status   = "PASSED" if all_passed else "FAILED"
 gate_color    = "#3fb950" if all_passed else "#f85149"
+gate_css      = "pass" if all_passed else "fail"
+gate_icon     = "✅" if all_passed else "❌"
+
+# Scan card CSS state + status label, by job result
+SCAN_STATE    = {"success": ("pass", "✅ Passed"), "failure": ("fail", "❌ Failed")}
 
 # ─────────────────────────────────────────────────────────
 # LOAD SCAN FINDINGS (for detailed table)
 # ─────────────────────────────────────────────────────────
 
-def load_json(pattern):
-    files = glob.glob(pattern, recursive=True)
-    if not files:
+def load_json(path):
+    report = Path(path)
+    if not report.is_file():
         return {}
     try:
-        with open(files[0]) as f:
-            return json.load(f)
+        return json_loads(report.read_bytes())
     except Exception:
         return {}
 
-def load_jsonl(pattern):
-    files = glob.glob(pattern, recursive=True)
+def load_jsonl(path, limit=None):
+    """Read up to `limit` JSONL records from raw bytes; blank or bad lines are skipped."""
     rows = []
-    if not files:
+    report = Path(path)
+    if not report.is_file():
         return rows
     try:
-        with open(files[0]) as f:
+        with report.open("rb") as f:
             for line in f:
-                line = line.strip()
-                if line:
-                    try:
-                        rows.append(json.loads(line))
-                    except Exception:
-                        pass
+                if limit is not None and len(rows) >= limit:
+                    break
+                try:
+                    rows.append(json_loads(line))
+                except Exception:
+                    pass
     except Exception:
         pass
     return rows
 
+# Reports are independent files — read and decode them concurrently
+with ThreadPoolExecutor(max_workers=4) as pool:
+    jobs = {
+        key: pool.submit(loader, path, **kwargs)
+        for key, loader, path, kwargs in (
+            ("sast", load_json,  "reports/report-sast/semgrep.json", {}),
+            ("sca",  load_json,  "reports/report-sca/trivy.json",    {}),
+            ("dast", load_jsonl, "reports/report-dast/nuclei.json",  {"limit": 10}),
+            ("iac",  load_json,  "reports/report-iac/checkov.json",  {}),
+        )
+    }
+
+# Fixed-shape row for the findings table (lighter than a dict per finding)
+Finding = namedtuple("Finding", "tool severity title file detail")
+
+def finding_row(tool, severity, title, file, detail):
+    """Build a Finding with text already cut to the table's display widths."""
+    return Finding(tool, severity, title[:60], file[:50], detail[:100])
+
+_EMPTY   = {}   # shared read-only default for missing nested objects
 findings = []
 
 # SAST findings
-sast_data = load_json("reports/report-sast/semgrep.json")
-for r in sast_data.get("results", [])[:20]:
-    sev = r.get("extra", {}).get("severity", "WARNING")
-    findings.append({
-        "tool": "Semgrep", "severity": "HIGH" if sev == "ERROR" else "MEDIUM",
-        "title": r.get("check_id", "").split(".")[-1],
-        "file": f"{r.get('path','')}:{r.get('start',{}).get('line','')}",
-        "detail": r.get("extra", {}).get("message", "")[:120],
-    })
+sast_data = jobs["sast"].result()
+for r in islice(sast_data.get("results", ()), 20):
+    extra = r.get("extra") or _EMPTY
+    sev = extra.get("severity", "WARNING")
+    findings.append(finding_row(
+        tool="Semgrep", severity="HIGH" if sev == "ERROR" else "MEDIUM",
+        title=r.get("check_id", "").split(".")[-1],
+        file=f"{r.get('path','')}:{(r.get('start') or _EMPTY).get('line','')}",
+        detail=extra.get("message", ""),
+    ))
 
 # SCA findings
-sca_data = load_json("reports/report-sca/trivy.json")
-for res in sca_data.get("Results", []):
-    for v in res.get("Vulnerabilities", [])[:10]:
-        if v.get("Severity") in ["CRITICAL", "HIGH"]:
-            findings.append({
-                "tool": "Trivy", "severity": v.get("Severity"),
-                "title": v.get("VulnerabilityID", ""),
-                "file": res.get("Target", ""),
-                "detail": f"{v.get('PkgName')} {v.get('InstalledVersion')} → fix: {v.get('FixedVersion','none')}",
-            })
+sca_data = jobs["sca"].result()
+findings.extend(
+    finding_row(
+        tool="Trivy", severity=v.get("Severity"),
+        title=v.get("VulnerabilityID", ""),
+        file=res.get("Target", ""),
+        detail=f"{v.get('PkgName')} {v.get('InstalledVersion')} → fix: {v.get('FixedVersion','none')}",
+    )
+    for res in sca_data.get("Results", ())
+    for v in islice(res.get("Vulnerabilities") or (), 10)
+    if v.get("Severity") in HIGH_CRIT
+)
 
 # DAST findings
-nuclei_rows = load_jsonl("reports/report-dast/nuclei.json")
-for r in nuclei_rows[:10]:
+nuclei_rows = jobs["dast"].result()
+for r in nuclei_rows:
     if not isinstance(r, dict):
         continue
-    sev = r.get("info", {}).get("severity", "info").upper()
-    if sev in ["CRITICAL", "HIGH", "MEDIUM"]:
-        findings.append({
-            "tool": "Nuclei", "severity": sev,
-            "title": r.get("info", {}).get("name", ""),
-            "file": r.get("matched-at", r.get("host", "")),
-            "detail": str(r.get("info", {}).get("description", ""))[:120],
-        })
+    info = r.get("info") or _EMPTY
+    sev = info.get("severity", "info").upper()
+    if sev in DAST_SEVERITIES:
+        findings.append(finding_row(
+            tool="Nuclei", severity=sev,
+            title=info.get("name", ""),
+            file=r.get("matched-at", r.get("host", "")),
+            detail=str(info.get("description", "")),
+        ))
 
 # IaC findings
-iac_data = load_json("reports/report-iac/checkov.json")
-for c in iac_data.get("results", {}).get("failed_checks", [])[:10]:
+iac_data = jobs["iac"].result()
+for c in islice(iac_data.get("results", {}).get("failed_checks", ()), 10):
     sev = c.get("severity", "MEDIUM")
-    if sev in ["CRITICAL", "HIGH"]:
-        findings.append({
-            "tool": "Checkov", "severity": sev,
-            "title": f"{c.get('check_id','')} — {c.get('check',{}).get('name','')}",
-            "file": f"{c.get('repo_file_path','')}:{c.get('file_line_range',[0])[0]}",
-            "detail": c.get("check", {}).get("guideline", "")[:120],
-        })
-
-# Sort by severity
-SEV_ORDER = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
-findings.sort(key=lambda x: SEV_ORDER.get(x["severity"], 99))
+    if sev in HIGH_CRIT:
+        check = c.get("check") or _EMPTY
+        findings.append(finding_row(
+            tool="Checkov", severity=sev,
+            title=f"{c.get('check_id','')} — {check.get('name','')}",
+            file=f"{c.get('repo_file_path','')}:{c.get('file_line_range',[0])[0]}",
+            detail=check.get("guideline", ""),
+        ))
+
+# Sort by severity — one stable bucket pass, unknown severities last
+buckets   = {sev: [] for sev in SEV_ORDER}
+unranked  = []
+for f in findings:
+    buckets.get(f.severity, unranked).append(f)
+findings = [f for sev in SEV_ORDER for f in buckets[sev]] + unranked
 
 # ─────────────────────────────────────────────────────────
 # ENROLLMENT TRACKING
 # ─────────────────────────────────────────────────────────
 
 ENROLLMENT_FILE = "enrollment-tracking.json"
+MAX_SCAN_HISTORY = 500
 
 def load_enrollment():
     try:
-        with open(ENROLLMENT_FILE) as f:
-            return json.load(f)
+        with open(ENROLLMENT_FILE, "rb") as f:
+            data = json_loads(f.read())
     except Exception:
-        return {"enrolled": {}, "scans": [], "stats": {}}
+        data = {"enrolled": {}, "scans": [], "stats": {}}
+    # Bounded history: appending evicts the oldest scan, no re-slicing
+    data["scans"] = deque(data.get("scans", []), maxlen=MAX_SCAN_HISTORY)
+    return data
 
-def update_enrollment(data):
-    now = datetime.now(timezone.utc).isoformat()
+def update_enrollment(data, now):
 
     # Register developer as enrolled
     if ACTOR and ACTOR != "unknown":
@@ -172,19 +243,22 @@ def update_enrollment(data):
         "total_issues" : total_issues,
         "results"      : {k: {"result": v["result"], "count": v["count"]} for k, v in RESULTS.items()},
     })
-    # Keep last 500 scans
-    data["scans"] = data["scans"][-500:]
-
-    # Update aggregate stats
+    # Update aggregate stats (one pass over the history)
     total_scans   = len(data["scans"])
-    passed_scans  = sum(1 for s in data["scans"] if s.get("gate") == "PASSED")
+    passed_scans  = 0
+    issues_found  = 0
+    for s in data["scans"]:
+        get = s.get
+        if get("gate") == "PASSED":
+            passed_scans += 1
+        issues_found += get("total_issues", 0)
     data["stats"] = {
         "total_scans"       : total_scans,
         "passed_scans"      : passed_scans,
         "failed_scans"      : total_scans - passed_scans,
         "pass_rate"         : round(passed_scans / total_scans * 100, 1) if total_scans else 0,
         "total_enrolled"    : len(data["enrolled"]),
-        "total_issues_found": sum(s.get("total_issues", 0) for s in data["scans"]),
+        "total_issues_found": issues_found,
         "last_updated"      : now,
     }
 
@@ -192,10 +266,10 @@ def update_enrollment(data):
 
 # Load + update
 enrollment = load_enrollment()
-enrollment = update_enrollment(enrollment)
+enrollment = update_enrollment(enrollment, NOW.isoformat())
 
-with open(ENROLLMENT_FILE, "w") as f:
-    json.dump(enrollment, f, indent=2)
+with open(ENROLLMENT_FILE, "wb") as f:
+    f.write(json_dumps_pretty(enrollment))
 print(f"✅ Enrollment tracking updated — {len(enrollment['enrolled'])} developers")
 
 # ─────────────────────────────────────────────────────────
@@ -298,19 +372,19 @@ HTML_TEMPLATE = """<!DOCTYPE html>
       · <a href="{{ run_url }}" style="color:#58a6ff" target="_blank">View pipeline run →</a>
     </div>
   </div>
-  <span class="badge {{ 'badge-pass' if all_passed else 'badge-fail' }}" style="margin-left:auto">
-    {{ '✅ GATE PASSED' if all_passed else '❌ GATE FAILED' }}
+  <span class="badge badge-{{ gate_css }}" style="margin-left:auto">
+    {{ gate_icon }} GATE {{ gate_status }}
   </span>
 </div>
 
 <div class="content">
 
   <!-- Gate Banner -->
-  <div class="gate-banner {{ 'gate-pass' if all_passed else 'gate-fail' }}">
-    <span class="gate-icon">{{ '✅' if all_passed else '❌' }}</span>
+  <div class="gate-banner gate-{{ gate_css }}">
+    <span class="gate-icon">{{ gate_icon }}</span>
     <div>
-      <div class="gate-title" style="color:{{ '#3fb950' if all_passed else '#f85149' }}">
-        Security Gate {{ 'PASSED' if all_passed else 'FAILED' }}
+      <div class="gate-title" style="color:{{ gate_color }}">
+        Security Gate {{ gate_status }}
       </div>
       <div class="gate-sub">
         {{ total_issues }} total issue(s) found across 5 scans ·
@@ -321,15 +395,15 @@ HTML_TEMPLATE = """<!DOCTYPE html>
 
   <!-- Scan Cards -->
   <div class="scans-grid">
-    {% for key, r in results.items() %}
-    <div class="scan-card {{ r.result if r.result in ['pass','fail'] else ('pass' if r.result == 'success' else ('fail' if r.result == 'failure' else 'unknown')) }}">
+    {% for r in scan_cards %}
+    <div class="scan-card {{ r.state }}">
       <div class="scan-tool">{{ r.tool }}</div>
       <div class="scan-label">{{ r.icon }} {{ r.label }}</div>
-      <div class="scan-count {{ 'pass' if r.result == 'success' else ('fail' if r.result == 'failure' else 'unknown') }}">
+      <div class="scan-count {{ r.state }}">
         {{ r.count }}
       </div>
-      <div class="scan-status {{ 'pass' if r.result == 'success' else ('fail' if r.result == 'failure' else 'unknown') }}">
-        {{ '✅ Passed' if r.result == 'success' else ('❌ Failed' if r.result == 'failure' else '⏳ ' + r.result) }}
+      <div class="scan-status {{ r.state }}">
+        {{ r.status }}
       </div>
     </div>
     {% endfor %}
@@ -359,10 +433,10 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             <td><span class="sev sev-{{ f.severity }}">{{ f.severity }}</span></td>
             <td><span class="tool-badge">{{ f.tool }}</span></td>
             <td>
-              <div class="finding-title">{{ f.title[:60] }}</div>
-              <div class="finding-detail">{{ f.detail[:100] }}</div>
+              <div class="finding-title">{{ f.title }}</div>
+              <div class="finding-detail">{{ f.detail }}</div>
             </td>
-            <td><span class="file-path">{{ f.file[:50] }}</span></td>
+            <td><span class="file-path">{{ f.file }}</span></td>
           </tr>
           {% endfor %}
         </tbody>
@@ -414,7 +488,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
           <tr>
             <td>@{{ name }}</td>
             <td>{{ dev.scan_count }}</td>
-            <td style="font-size:11px; color:#8b949e;">{{ dev.last_scan[:10] }}</td>
+            <td style="font-size:11px; color:#8b949e;">{{ dev.last_scan }}</td>
           </tr>
           {% endfor %}
         </tbody>
@@ -439,7 +513,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
       <tbody>
         {% for s in recent_scans %}
         <tr>
-          <td style="font-size:11px; color:#8b949e;">{{ s.timestamp[:16] }}</td>
+          <td style="font-size:11px; color:#8b949e;">{{ s.timestamp }}</td>
           <td>@{{ s.actor }}</td>
           <td style="font-size:12px;">{{ s.repo }}</td>
           <td style="font-family:monospace; font-size:11px; color:#79c0ff;">{{ s.ref }}</td>
@@ -451,7 +525,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             {% endif %}
           </td>
           <td>{{ s.total_issues }}</td>
-          <td><a href="{{ s.run_url }}" style="color:#58a6ff; font-size:11px;" target="_blank">#{{ s.run_id[-6:] }}</a></td>
+          <td><a href="{{ s.run_url }}" style="color:#58a6ff; font-size:11px;" target="_blank">#{{ s.run_id }}</a></td>
         </tr>
         {% endfor %}
       </tbody>
@@ -471,25 +545,52 @@ HTML_TEMPLATE = """<!DOCTYPE html>
 </body>
 </html>"""
 
+# Compiled once; the bytecode is also cached on disk so warm (self-hosted)
+# runners skip the parse + compile on later runs. Jinja's default cache dir
+# is per-user (mode 0700, owner checked), so another account on a shared
+# runner cannot plant cached code.
+DASHBOARD_FILE = "security-dashboard.html"
+JINJA_ENV = Environment(
+    loader=DictLoader({DASHBOARD_FILE: HTML_TEMPLATE}),
+    autoescape=True,
+    auto_reload=False,
+    bytecode_cache=FileSystemBytecodeCache(),
+)
+DASHBOARD_TEMPLATE = JINJA_ENV.get_template(DASHBOARD_FILE)
+
 # ─────────────────────────────────────────────────────────
 # RENDER DASHBOARD
 # ─────────────────────────────────────────────────────────
 
-recent_scans = list(reversed(enrollment.get("scans", [])))[:10]
+# Table rows with display fields already cut (date/minute, short run id)
+recent_scans = [
+    {**s, "timestamp": s.get("timestamp", "")[:16], "run_id": s.get("run_id", "")[-6:]}
+    for s in islice(reversed(enrollment.get("scans", ())), 10)
+]
+enrolled = {
+    name: {**dev, "last_scan": dev.get("last_scan", "")[:10]}
+    for name, dev in enrollment.get("enrolled", {}).items()
+}
+
+scan_cards = []
+for r in RESULTS.values():
+    state, status = SCAN_STATE.get(r["result"], ("unknown", f"⏳ {r['result']}"))
+    scan_cards.append({**r, "state": state, "status": status})
 
-html = Template(HTML_TEMPLATE).render(
+html = DASHBOARD_TEMPLATE.render(
     repo=REPO, ref=REF, event=EVENT, timestamp=TIMESTAMP,
     run_url=RUN_URL, actor=ACTOR,
-    results=RESULTS, all_passed=all_passed, total_issues=total_issues,
+    scan_cards=scan_cards, total_issues=total_issues,
+    gate_status=gate_status, gate_color=gate_color, gate_css=gate_css, gate_icon=gate_icon,
     findings=findings,
-    enrolled=enrollment.get("enrolled", {}),
+    enrolled=enrolled,
     stats=enrollment.get("stats", {}),
     recent_scans=recent_scans,
 )
 
-with open("security-dashboard.html", "w") as f:
+with open(DASHBOARD_FILE, "w") as f:
     f.write(html)
-print("✅ Dashboard generated: security-dashboard.html")
+print(f"✅ Dashboard generated: {DASHBOARD_FILE}")
 
 # ─────────────────────────────────────────────────────────
 # PR SUMMARY MARKDOWN
@@ -498,15 +599,16 @@ print("✅ Dashboard generated: security-dashboard.html")
 def result_emoji(r):
     return "✅" if r == "success" else ("❌" if r == "failure" else "⏳")
 
+summary_rows = "\n".join(
+    f"| {r['icon']} {r['label']} | {r['tool']} | {r['count']} | {result_emoji(r['result'])} {r['result']} |"
+    for r in RESULTS.values()
+)
+
 summary = f"""## 🛡️ SecurOps Security Scan Results
 
 | Scan | Tool | Issues | Status |
 |------|------|--------|--------|
-| 🔐 Secrets | Gitleaks | {RESULTS['secrets']['count']} | {result_emoji(RESULTS['secrets']['result'])} {RESULTS['secrets']['result']} |
-| 🔍 SAST | Semgrep | {RESULTS['sast']['count']} | {result_emoji(RESULTS['sast']['result'])} {RESULTS['sast']['result']} |
-| 🛡️ SCA | Trivy | {RESULTS['sca']['count']} | {result_emoji(RESULTS['sca']['result'])} {RESULTS['sca']['result']} |
-| 🌐 DAST | Nuclei | {RESULTS['dast']['count']} | {result_emoji(RESULTS['dast']['result'])} {RESULTS['dast']['result']} |
-| 🏗️ IaC | Checkov | {RESULTS['iac']['count']} | {result_emoji(RESULTS['iac']['result'])} {RESULTS['iac']['result']} |
+{summary_rows}
 
 **Security Gate:** {"✅ PASSED — safe to merge" if all_passed else "❌ FAILED — merge blocked"}
 